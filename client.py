@@ -0,0 +1,98 @@
+"""
+Thin command line client of the query daemon (see daemon.py). Uses standard
+library only to start fast
+"""
+
+import os
+import sys
+import json
+import socket
+from datetime import datetime
+from argparse import ArgumentParser
+import defs
+
+
+def query(request: dict, socket_path: str = defs.SOCKET_PATH) -> dict:
+    """
+    Send single request to the daemon and wait for response
+
+    Args:
+        request (dict): JSON-serializable request, see daemon.QueryDaemon
+        socket_path (str): daemon Unix socket
+
+    Returns:
+        decoded response
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("Query candlesticks and EMA from running daemon")
+    parser.add_argument("--socket", metavar="filename", type=str,
+                        default=defs.SOCKET_PATH,
+                        help=f"set daemon socket (default: {defs.SOCKET_PATH})")
+    parser.add_argument("--csv", metavar="filename", type=str,
+                        help="csv file to aggregate")
+    parser.add_argument("--period", choices=defs.Period.marks,
+                        default="5m", help="set candlesticks period "
+                                           "(default: 5m)")
+    parser.add_argument("--length", metavar="value", type=int, default=14,
+                        help="set EMA length (default: 14)")
+    # time range is given in the same format as csv datetime column
+    parser.add_argument("--start", metavar="datetime", type=str,
+                        help="skip candles closed before given datetime")
+    parser.add_argument("--end", metavar="datetime", type=str,
+                        help="skip candles closed after given datetime")
+    parser.add_argument("--stats", action="store_true",
+                        help="print daemon cache usage")
+    args = parser.parse_args()
+
+    if args.stats:
+        request = {"command": "stats"}
+    elif args.csv is None:
+        parser.error("--csv is required")
+    else:
+        request = {"csv": os.path.abspath(args.csv), "period": args.period,
+                   "length": args.length}
+        for name in ("start", "end"):
+            if getattr(args, name) is not None:
+                try:
+                    request[name] = datetime.fromisoformat(
+                        getattr(args, name)).timestamp()
+                except ValueError:
+                    parser.error(f"--{name} must be ISO datetime, "
+                                 f"\"{getattr(args, name)}\" given")
+
+    try:
+        response = query(request, args.socket)
+    except OSError as error:
+        print(f"Error: failed to connect to daemon at \"{args.socket}\": "
+              f"{error}")
+        sys.exit(1)
+    except ValueError:
+        # daemon closed connection without valid response
+        print("Error: invalid response from daemon")
+        sys.exit(1)
+
+    if "error" in response:
+        print(f"Error: {response['error']}")
+        sys.exit(1)
+
+    if args.stats:
+        print(json.dumps(response, indent=2))
+    else:
+        # print candlesticks as csv, timestamps as local datetime: csv files
+        # and --start/--end are parsed in local time too
+        print(",".join(response["columns"]))
+        for ts, *values in response["rows"]:
+            print(",".join([datetime.fromtimestamp(ts)
+                            .strftime("%Y-%m-%d %H:%M:%S"),
+                            *map(str, values)]))
+
+    # report latency to stderr to keep stdout clean
+    print(f"latency: {response['latency_ms']} ms"
+          f"{' (cached)' if response.get('cached') else ''}", file=sys.stderr)
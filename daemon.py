@@ -0,0 +1,351 @@
+"""
+Resident query daemon that keeps parsed ticks and calculated candlesticks in
+memory between requests and answers queries over a Unix socket.
+See client.py for the command line client
+"""
+
+import os as _os
+import stat as _stat
+import socket as _socket
+import json as _json
+import hashlib as _hashlib
+import threading as _threading
+import socketserver as _socketserver
+from collections import OrderedDict as _OrderedDict
+from sys import exit as _sys_exit
+from time import perf_counter as _perf_counter
+from argparse import ArgumentParser as _ArgumentParser
+import numpy as _np
+import defs as _defs
+import numpy_implementation as _impl
+
+
+# default limit for arrays kept in memory (megabytes)
+DEFAULT_MAX_MEMORY = 512
+
+# output columns of a query
+COLUMNS = (_defs.TS, _defs.OPEN, _defs.HIGH, _defs.LOW, _defs.CLOSE, _defs.EMA)
+
+
+class _LruCache:
+    """
+    Thread-safe least recently used cache of numpy arrays tuples. Total size
+    of stored arrays is bounded, the oldest entries are evicted first.
+    Every value is calculated once even if requested by several clients at
+    the same time
+    """
+    def __init__(self, max_bytes: int):
+        self.__max_bytes = max_bytes
+        self.__items = _OrderedDict()
+        self.__nbytes = 0
+        self.__lock = _threading.Lock()
+        # locks of values being calculated right now
+        self.__pending = {}
+
+    def __lookup(self, key):
+        # must be called with self.__lock acquired
+        if key in self.__items:
+            self.__items.move_to_end(key)
+            return self.__items[key][0]
+        return None
+
+    def get_or_calculate(self, key, calculate) -> tuple:
+        """
+        Return value stored with given key or store the result of
+        'calculate()'. Second item of returned tuple is True on cache hit
+        """
+        with self.__lock:
+            value = self.__lookup(key)
+            if value is not None:
+                return value, True
+            key_lock = self.__pending.setdefault(key, _threading.Lock())
+
+        with key_lock:
+            # value could be calculated by another client while waiting
+            with self.__lock:
+                value = self.__lookup(key)
+                if value is not None:
+                    return value, True
+
+            try:
+                value = calculate()
+            except BaseException:
+                with self.__lock:
+                    self.__pending.pop(key, None)
+                raise
+
+            nbytes = sum(array.nbytes for array in value)
+            with self.__lock:
+                # store the value and release pending key at once, so
+                # nobody can miss both of them
+                self.__pending.pop(key, None)
+                if key in self.__items:
+                    self.__nbytes -= self.__items[key][1]
+                self.__items[key] = (value, nbytes)
+                self.__items.move_to_end(key)
+                self.__nbytes += nbytes
+                # evict the oldest entries but keep the new one
+                while self.__nbytes > self.__max_bytes and \
+                        len(self.__items) > 1:
+                    _, (_, evicted) = self.__items.popitem(last=False)
+                    self.__nbytes -= evicted
+            return value, False
+
+    def stats(self) -> dict:
+        """Number of entries and memory usage"""
+        with self.__lock:
+            return {"entries": len(self.__items), "bytes": self.__nbytes,
+                    "max_bytes": self.__max_bytes}
+
+
+def _load_ticks(filename: str, cache_dir: str, stat: _os.stat_result) \
+        -> _np.ndarray:
+    """
+    Parse given csv file once and keep the result in cache directory as
+    *.npy file. Cached file is memory-mapped, so restarted daemon doesn't
+    parse csv again. Cache directory keeps the latest parsed version of every
+    csv file only and may be cleaned up at any time
+    """
+    # cache file name consists of csv path hash and csv content version
+    name_key = _hashlib.sha1(filename.encode()).hexdigest()
+    npy_filename = f"{cache_dir}/{name_key}-{stat.st_mtime_ns}-" \
+                   f"{stat.st_size}.npy"
+
+    if not _os.path.isfile(npy_filename):
+        _os.makedirs(cache_dir, exist_ok=True)
+        # write to temporary file first to never map incomplete cache
+        tmp_filename = f"{npy_filename}.{_os.getpid()}." \
+                       f"{_threading.get_ident()}.tmp"
+        # single row file is read as 0-d array
+        ticks = _np.atleast_1d(_impl.read_csv_file(filename))
+        # genfromtxt() replaces values it failed to convert with NaN
+        if not len(ticks) or _np.isnan(ticks[_defs.TS]).any() or \
+                _np.isnan(ticks[_defs.PRICE]).any():
+            raise ValueError(f"\"{filename}\" must contain datetime-price "
+                             f"rows")
+        with open(tmp_filename, "wb") as tmp_file:
+            _np.save(tmp_file, ticks)
+        _os.replace(tmp_filename, npy_filename)
+
+        # remove previous versions of the same csv file. Mapped arrays stay
+        # valid after removal
+        for entry in _os.scandir(cache_dir):
+            if entry.name.startswith(f"{name_key}-") and \
+                    entry.name.endswith(".npy") and \
+                    entry.path != npy_filename:
+                _os.unlink(entry.path)
+
+    return _np.load(npy_filename, mmap_mode='r')
+
+
+@_defs.csv_file_is_valid
+def _assert_query_is_valid(filename: str, period: str, length: int):
+    # filename and period are checked by decorator
+    assert isinstance(length, int) and length > 0, \
+        f"query: 'length' must be positive non-zero integer, {length} given"
+
+
+def _select(candles: _np.ndarray, ema: _np.ndarray, period: int, length: int,
+            start: float = None, end: float = None) -> list:
+    """
+    Expand sparse candlesticks and EMA that fall into [start, end] time range
+    to rows of output columns
+    """
+    timestamps = candles[_defs.TS]
+
+    # first row is the one that contains start timestamp
+    first = 0 if start is None else \
+        max(int(_np.searchsorted(timestamps, start, side="right")) - 1, 0)
+    stop = len(candles) if end is None else \
+        int(_np.searchsorted(timestamps, end, side="right"))
+    # previous row is needed to restore EMA inside the first run
+    first = max(first - 1, 0)
+    if stop <= first:
+        return []
+
+    dense, dense_ema = _impl.sparse_to_dense(candles[first:stop],
+                                             ema[first:stop], period, length)
+
+    # trim runs that cross range boundaries
+    mask = _np.ones(len(dense), dtype=bool)
+    if start is not None:
+        mask &= dense[_defs.TS] >= start
+    if end is not None:
+        mask &= dense[_defs.TS] <= end
+
+    return _np.column_stack([dense[col][mask] for col in COLUMNS[:-1]] +
+                            [dense_ema[_defs.EMA][mask]]).tolist()
+
+
+def _remove_stale_socket(socket_path: str):
+    """
+    Remove socket file left by stopped daemon. Any other file and socket of
+    running daemon are kept
+    """
+    try:
+        mode = _os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+
+    # explicit check instead of assertion: it must survive "python -O",
+    # otherwise connect() below fails for a regular file too and the file
+    # is removed
+    if not _stat.S_ISSOCK(mode):
+        raise FileExistsError(f"\"{socket_path}\" exists and is not a socket")
+
+    with _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            # nobody listens: the socket is stale
+            _os.unlink(socket_path)
+            return
+
+    raise FileExistsError(f"another daemon is listening on "
+                          f"\"{socket_path}\"")
+
+
+class QueryDaemon (_socketserver.ThreadingMixIn,
+                   _socketserver.UnixStreamServer):
+    """
+    Threading Unix socket server answering candlesticks and EMA queries.
+    Each request and response is a single line of JSON:
+        {"csv": filename, "period": mark, "length": value,
+         "start": timestamp, "end": timestamp}
+    start and end are optional. {"command": "stats"} returns cache usage.
+    Parsed ticks and calculated candlesticks are shared by all clients
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = _defs.SOCKET_PATH,
+                 max_memory: int = DEFAULT_MAX_MEMORY * 2**20,
+                 cache_dir: str = _defs.DATA_DIR):
+        self.cache = _LruCache(max_memory)
+        self.cache_dir = cache_dir
+
+        _remove_stale_socket(socket_path)
+        _os.makedirs(_os.path.dirname(socket_path) or '.', exist_ok=True)
+
+        # server_close() is called by base class if bind() fails: the socket
+        # file must be removed only if it was created by this daemon
+        self.__bound = False
+        super().__init__(socket_path, _QueryHandler)
+        self.__bound = True
+
+    def server_close(self):
+        super().server_close()
+        if self.__bound:
+            self.__bound = False
+            _os.unlink(self.server_address)
+
+    def load_ticks(self, filename: str) -> tuple:
+        """Get parsed ticks of given csv file from cache"""
+        stat = _os.stat(filename)
+        (ticks,), hit = self.cache.get_or_calculate(
+            ("ticks", filename, stat.st_mtime_ns),
+            lambda: (_load_ticks(filename, self.cache_dir, stat),))
+        return ticks, stat, hit
+
+    def query(self, request: dict) -> dict:
+        """Answer single request"""
+        if not isinstance(request, dict):
+            raise ValueError(f"query: request must be JSON object, "
+                             f"{type(request).__name__} given")
+
+        if request.get("command") == "stats":
+            return self.cache.stats()
+
+        filename = _os.path.abspath(request["csv"])
+        period = request.get("period", "5m")
+        length = request.get("length", 14)
+        _assert_query_is_valid(filename, period, length)
+
+        ticks, stat, _ = self.load_ticks(filename)
+
+        # candlesticks and EMA are kept in sparse form: memory depends on the
+        # number of traded periods only
+        def calculate() -> tuple:
+            candles = _impl.convert_to_sparse_candlesticks(
+                ticks, _impl.Period[period])
+            return candles, _impl.calculate_sparse_ema(candles, length)
+
+        (candles, ema), hit = self.cache.get_or_calculate(
+            ("candles", filename, stat.st_mtime_ns, period, length),
+            calculate)
+
+        return {"columns": COLUMNS, "cached": hit,
+                "rows": _select(candles, ema, _impl.Period[period], length,
+                                request.get("start"), request.get("end"))}
+
+
+class _QueryHandler (_socketserver.StreamRequestHandler):
+    """Reads JSON requests line by line and writes JSON responses"""
+
+    def handle(self):
+        for line in self.rfile:
+            started = _perf_counter()
+            try:
+                request = _json.loads(line)
+                response = self.server.query(request)
+            # every request line must get an answer, whatever it contains
+            except Exception as error:  # pylint: disable=W0703
+                request = line.decode(errors="replace").strip()
+                response = {"error": str(error) or type(error).__name__}
+            response["latency_ms"] = round((_perf_counter() - started) * 1000,
+                                           3)
+
+            # report per-query latency
+            print(f"{request} -> {response.get('error', 'ok')} in "
+                  f"{response['latency_ms']} ms"
+                  f"{' (cached)' if response.get('cached') else ''}",
+                  flush=True)
+
+            self.wfile.write(_json.dumps(response).encode() + b"\n")
+
+
+if __name__ == "__main__":
+    parser = _ArgumentParser("Resident daemon answering candlesticks and EMA "
+                             "queries over a Unix socket")
+    parser.add_argument("--socket", metavar="filename", type=str,
+                        default=_defs.SOCKET_PATH,
+                        help=f"set socket path (default: {_defs.SOCKET_PATH})")
+    parser.add_argument("--max-memory", metavar="megabytes", type=int,
+                        default=DEFAULT_MAX_MEMORY,
+                        help="set memory limit for cached ticks and "
+                             f"candlesticks (default: {DEFAULT_MAX_MEMORY})")
+    parser.add_argument("--cache-dir", metavar="dirname", type=str,
+                        default=_defs.DATA_DIR,
+                        help="set cache directory to keep parsed csv files. "
+                             "Only the latest version of every csv file is "
+                             f"kept (default: {_defs.DATA_DIR})")
+    parser.add_argument("--preload", metavar="filename", type=str, nargs='+',
+                        default=[], help="csv files to load on start")
+    args = parser.parse_args()
+
+    # check preloaded files before start the same way as queried ones
+    for csv_filename in args.preload:
+        if not _os.path.isfile(csv_filename) or \
+                _os.path.splitext(csv_filename)[1] != ".csv":
+            print(f"Error: CSV file must be provided, "
+                  f"\"{csv_filename}\" is not a csv file")
+            _sys_exit(1)
+
+    try:
+        daemon = QueryDaemon(args.socket, args.max_memory * 2**20,
+                             args.cache_dir)
+    except OSError as error:
+        print(f"Error: failed to start daemon: {error}")
+        _sys_exit(1)
+
+    with daemon:
+        for csv_filename in args.preload:
+            try:
+                daemon.load_ticks(_os.path.abspath(csv_filename))
+            except (ValueError, OSError) as error:
+                print(f"Error: failed to load \"{csv_filename}\": {error}")
+                _sys_exit(1)
+        print(f"Listening on \"{args.socket}\"", flush=True)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
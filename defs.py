@@ -1,5 +1,6 @@
 """Implementation independent definitions"""
 from os import path as _path
+from tempfile import gettempdir as _gettempdir
 
 
 class Period (dict):
@@ -16,6 +17,13 @@ class Period (dict):
         raise NotImplementedError
 
 
+# directory to download, extract and cache files
+DATA_DIR = f"{_gettempdir()}/candles_and_ema"
+
+# default Unix socket of the query daemon
+SOCKET_PATH = f"{DATA_DIR}/daemon.sock"
+
+
 # Column names for tables
 TS = "Timestamp"
 PRICE = "Price"
@@ -24,20 +32,41 @@ HIGH = "High"
 LOW = "Low"
 CLOSE = "Close"
 EMA = "EMA"
+# number of candles covered by a row of sparse candlesticks table
+COUNT = "Count"
+
+
+def _assert_csv_file(func, filename: str):
+    # assert that given filename exist and has ".csv" extension
+    assert _path.isfile(filename) and \
+           _path.splitext(filename)[1] == ".csv", \
+        f"{func.__name__}(): 'filename' must be *.csv file, " \
+        f"{filename} given"
+
+
+def _assert_period(func, period: str):
+    # assert that given period is one of valid marks
+    assert period in Period.marks, \
+        f"{func.__name__}(): 'period' must be any of " \
+        f"{list(Period.marks)}, \"{period}\" given"
 
 
 def csv_file_is_valid(func):
     def magic(filename: str, period: str, *args, **kwargs):
-        # assert that given filename exist and has ".csv" extension
-        assert _path.isfile(filename) and \
-               _path.splitext(filename)[1] == ".csv", \
-            f"{func.__name__}(): 'filename' must be *.csv file, " \
-            f"{filename} given"
+        _assert_csv_file(func, filename)
+        _assert_period(func, period)
+        return func(filename, period, *args, **kwargs)
+    return magic
 
-        # assert that given period is one of valid marks
-        assert period in Period.marks, \
-            f"{func.__name__}(): 'period' must be any of " \
-            f"{list(Period.marks)}, \"{period}\" given"
 
-        return func(filename, period, *args, **kwargs)
+def csv_files_are_valid(func):
+    def magic(filenames: list, period: str, *args, **kwargs):
+        # assert that at least one file given
+        assert len(filenames), \
+            f"{func.__name__}(): 'filenames' must be non-empty"
+
+        for filename in filenames:
+            _assert_csv_file(func, filename)
+        _assert_period(func, period)
+        return func(filenames, period, *args, **kwargs)
     return magic
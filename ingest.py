@@ -0,0 +1,178 @@
+"""
+Streaming ingest of one or several timestamp-price CSV-files into a single
+time-ordered tick stream
+"""
+
+import csv as _csv
+from datetime import datetime as _datetime
+from heapq import heappush as _heappush, heappop as _heappop, \
+    merge as _heap_merge
+from typing import Iterable as _Iterable, Iterator as _Iterator, \
+    Tuple as _Tuple
+import numpy as _np
+import defs as _defs
+
+
+# Tick is a (timestamp, price) pair
+Tick = _Tuple[float, float]
+
+# default number of ticks kept in the reordering buffer of every source
+DISORDER_WINDOW = 64
+
+
+def read_ticks(filename: str) -> _Iterator[Tick]:
+    """
+    Lazily read timestamp-price pairs from given csv file row by row
+
+    Args:
+        filename (str): path to csv-file with header, datetime string in the
+                        first column and price in the second one
+
+    Returns:
+        iterator over (timestamp, price) tuples in file order
+    """
+    with open(filename, newline='', encoding="ascii") as csv_file:
+        reader = _csv.reader(csv_file)
+        # skip header in favor of project-wide column names
+        next(reader, None)
+        for row in reader:
+            # ignore blank lines
+            if not row:
+                continue
+            yield _datetime.fromisoformat(row[0]).timestamp(), float(row[1])
+
+
+def repair_local_disorder(ticks: _Iterable[Tick],
+                          window: int = DISORDER_WINDOW) -> _Iterator[Tick]:
+    """
+    Reorder ticks that arrive no more than 'window' positions late.
+    Ticks with equal timestamps keep their original order, so open and close
+    prices of a candle are not affected by the repair.
+
+    Args:
+        ticks (Iterable): (timestamp, price) tuples
+        window (int): size of the reordering buffer
+
+    Returns:
+        iterator over (timestamp, price) tuples sorted by timestamp
+    """
+
+    # set alias for function name
+    me = f"{repair_local_disorder.__name__}()"
+    # assert that given window is positive non-zero integer
+    assert isinstance(window, int) and window > 0, \
+        f"{me}: 'window' must be positive non-zero integer, {window} given"
+
+    # buffer entries are (timestamp, sequence number, price): the sequence
+    # number makes the ordering stable for equal timestamps
+    buffer = []
+    last_timestamp = None
+
+    def pop_tick() -> Tick:
+        nonlocal last_timestamp
+        timestamp, _, price = _heappop(buffer)
+        # tick older than the already emitted one can't be repaired within
+        # given window
+        assert last_timestamp is None or timestamp >= last_timestamp, \
+            f"{me}: tick at {timestamp} is out of order by more than " \
+            f"{window} positions"
+        last_timestamp = timestamp
+        return timestamp, price
+
+    for seq, (timestamp, price) in enumerate(ticks):
+        _heappush(buffer, (timestamp, seq, price))
+        if len(buffer) > window:
+            yield pop_tick()
+
+    # flush the buffer
+    while buffer:
+        yield pop_tick()
+
+
+def _number_occurrences(ticks: _Iterable[Tick]) \
+        -> _Iterator[_Tuple[float, float, int]]:
+    """
+    Tag every tick of time-ordered source with the number of its previous
+    occurrences at the same timestamp. Only prices seen at the current
+    timestamp are remembered, so memory doesn't grow with the stream
+    """
+    current_timestamp = None
+    occurrences = {}
+    for timestamp, price in ticks:
+        if timestamp != current_timestamp:
+            current_timestamp = timestamp
+            occurrences.clear()
+        occurrence = occurrences.get(price, 0)
+        occurrences[price] = occurrence + 1
+        yield timestamp, price, occurrence
+
+
+def drop_duplicates(ticks: _Iterable[_Tuple[float, float, int]]) \
+        -> _Iterator[Tick]:
+    """
+    Skip ticks repeated across merged sources. Every tick is tagged with its
+    occurrence number inside its own source, so a price repeated within a
+    source is kept and the largest per-source count of every tick survives
+
+    Args:
+        ticks (Iterable): (timestamp, price, occurrence) tuples sorted by
+                          timestamp
+
+    Returns:
+        iterator over (timestamp, price) tuples
+    """
+    current_timestamp = None
+    seen = set()
+    for timestamp, price, occurrence in ticks:
+        if timestamp != current_timestamp:
+            current_timestamp = timestamp
+            seen.clear()
+        elif (price, occurrence) in seen:
+            continue
+        seen.add((price, occurrence))
+        yield timestamp, price
+
+
+def merge_ticks(*sources: _Iterable[Tick],
+                window: int = DISORDER_WINDOW) -> _Iterator[Tick]:
+    """
+    Streaming k-way merge of several tick sources into one time-ordered
+    stream. Every source is repaired with bounded reordering buffer first and
+    ticks repeated across overlapping sources are dropped from the result
+
+    Args:
+        sources (Iterable): iterables of (timestamp, price) tuples
+        window (int): reordering buffer size of every source
+
+    Returns:
+        iterator over (timestamp, price) tuples sorted by timestamp
+    """
+    # heapq.merge is stable, so equal timestamps are taken from sources in
+    # given order
+    return drop_duplicates(
+        _heap_merge(*(_number_occurrences(repair_local_disorder(source,
+                                                                window))
+                      for source in sources),
+                    key=lambda tick: tick[0]))
+
+
+def merge_csv_files(filenames: _Iterable[str],
+                    window: int = DISORDER_WINDOW) -> _np.ndarray:
+    """
+    Read given csv files into a single timestamp-price table sorted by
+    timestamp. Files are read lazily, so only the output table and the
+    reordering buffers are kept in memory
+
+    Args:
+        filenames (Iterable): paths to csv-files containing timestamp-price
+                              pairs
+        window (int): reordering buffer size of every file
+
+    Returns:
+        structured numpy.ndarray with timestamp and price columns
+    """
+    return _np.fromiter(merge_ticks(*(read_ticks(filename)
+                                      for filename in filenames),
+                                    window=window),
+                        dtype=[(_defs.TS, _np.float64),
+                               (_defs.PRICE, _np.float64)])
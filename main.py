@@ -5,18 +5,19 @@ from sys import exit as sys_exit
 from io import BytesIO
 from zipfile import ZipFile
 from argparse import ArgumentParser
-from tempfile import gettempdir
+from functools import partial
 from urllib import request as url_request
 import mplfinance as mpf
 from pytest import main as pytest_main
 import defs
+import ingest
 
 
 # url given in test assignment
 DATA_FILE_URL = "https://perp-analysis.s3.amazonaws.com/interview/prices.csv.zip"
 
 # directory to download and extract files
-data_dir = f"{gettempdir()}/candles_and_ema"
+data_dir = defs.DATA_DIR
 
 
 def __csv_filename(url: str = DATA_FILE_URL) -> str:
@@ -71,6 +72,22 @@ if __name__ == "__main__":
     parser.add_argument("--csv", metavar="filename", type=str,
                         help="csv file to aggregate. If no file given, the "
                              "default one will be downloaded automatically")
+    # set several csv files to merge into one time-ordered tick stream
+    parser.add_argument("--merge", metavar="filename", type=str, nargs='+',
+                        help="csv files to merge and aggregate together. "
+                             "Files may overlap in time, duplicate ticks are "
+                             "dropped (numpy implementation only)")
+    # set reordering buffer size for merged files
+    parser.add_argument("--window", metavar="value", type=int,
+                        default=ingest.DISORDER_WINDOW,
+                        help="max number of positions a tick may be out of "
+                             "order within merged file "
+                             f"(default: {ingest.DISORDER_WINDOW})")
+    # store runs of empty candles in run-length form
+    parser.add_argument("--sparse", action="store_true",
+                        help="calculate candlesticks and EMA over runs of "
+                             "empty periods in closed form (numpy "
+                             "implementation only)")
     # set implementation: pandas build-in methods or numpy-based raw
     # calculations
     impl_group = parser.add_mutually_exclusive_group()
@@ -99,6 +116,24 @@ if __name__ == "__main__":
     if args.test:
         sys_exit(pytest_main(["-v", "test.py"]))
 
+    # sparse candlesticks are implemented with numpy only
+    if args.sparse and args.pandas:
+        print("Error: --sparse can't be combined with --pandas")
+        sys_exit(1)
+
+    # merge given csv files into a single stream
+    if args.merge is not None:
+        if args.csv is not None or args.pandas:
+            print("Error: --merge can't be combined with --csv or --pandas")
+            sys_exit(1)
+        for filename in args.merge:
+            if not os.path.isfile(filename):
+                print(f"Error: CSV file must be provided, "
+                      f"\"{filename}\" is not a file")
+                sys_exit(1)
+        # the first file names the output figure
+        args.csv = args.merge[0]
+
     # use csv file provided as argument or download the file mentioned in
     # test assignment. Show error if download/unzip failed or invalid file
     # provided
@@ -139,14 +174,21 @@ if __name__ == "__main__":
     if args.pandas and not args.numpy:
         from pandas_implementation import process_csv_file
     elif args.numpy and not args.pandas:
-        from numpy_implementation import process_csv_file
+        from numpy_implementation import process_csv_file as _process_numpy
+        # numpy implementation optionally keeps empty candles in sparse form
+        process_csv_file = partial(_process_numpy, sparse=args.sparse)
     else:
         print("Error! Invalid implementation provided")
         exit(1)
 
     # process csv file to get DataFrame with OHLC and EMA data indexed by
     # given periods timestamps
-    df = process_csv_file(args.csv, args.period, args.length)
+    if args.merge is not None:
+        from numpy_implementation import process_csv_files
+        df = process_csv_files(args.merge, args.period, args.length,
+                               args.window, sparse=args.sparse)
+    else:
+        df = process_csv_file(args.csv, args.period, args.length)
 
     # prepare EMA line plot
     ema_line = mpf.make_addplot(df[[defs.EMA]], type="line")
@@ -10,6 +10,7 @@ import numpy as _np
 from pandas import DataFrame as _DataFrame
 from numpy.lib.recfunctions import merge_arrays as _merge_arrays
 import defs as _defs
+import ingest as _ingest
 
 
 class __Period (_defs.Period):
@@ -67,6 +68,11 @@ def assert_table_is_valid(func):
     return magic
 
 
+def timestamps_are_sorted(tbl: _np.ndarray) -> bool:
+    """Vectorized check that timestamps of given table are non-decreasing"""
+    return bool(_np.all(tbl[_defs.TS][1:] >= tbl[_defs.TS][:-1]))
+
+
 @assert_table_is_valid
 def convert_to_candlesticks(tbl: _np.ndarray, period: int = Period["5m"]):
     """
@@ -96,6 +102,11 @@ def convert_to_candlesticks(tbl: _np.ndarray, period: int = Period["5m"]):
     assert isinstance(period, int), \
         f"{me}: 'period' must be integer, {type(period)} given"
 
+    # assert that given table is sorted by timestamp: slices below are
+    # searched forward only
+    assert timestamps_are_sorted(tbl), \
+        f"{me}: 'tbl' must be sorted by \"{_defs.TS}\" column"
+
     # round down first timestamp to given period to get start point
     start_timestamp = int(tbl[_defs.TS][0] // period * period)
     # round up last timestamp to given period to get end point
@@ -201,8 +212,199 @@ def calculate_ema(tbl: _np.ndarray, length: int = 14) -> _np.ndarray:
     return ema
 
 
+@assert_table_is_valid
+def convert_to_sparse_candlesticks(tbl: _np.ndarray,
+                                   period: int = Period["5m"]) -> _np.ndarray:
+    """
+    Sparse variant of :convert_to_candlesticks: Traded periods are stored as
+     ordinary candles and every run of empty periods is stored as a single row
+     with the timestamp of its first candle, the number of candles in the run
+     and the repeated close price of the previous period. Size of the table
+     depends on the number of traded periods only.
+
+    Args:
+        tbl (numpy.ndarray): structured array containing timestamp and price
+                             columns sorted by timestamp
+        period (int): candlestick duration in seconds
+
+    Returns:
+        structured numpy.ndarray with timestamps, open, high, low, close
+        prices and number of candles covered by each row
+    """
+
+    # alias the function name
+    me = f"{convert_to_sparse_candlesticks.__name__}()"
+
+    # assert that given table contains price column
+    assert _defs.PRICE in tbl.dtype.names, \
+        f"{me}: 'tbl' must contain named column \"{_defs.PRICE}\""
+
+    # assert that given period is integer
+    assert isinstance(period, int), \
+        f"{me}: 'period' must be integer, {type(period)} given"
+
+    # assert that given table is sorted by timestamp
+    assert timestamps_are_sorted(tbl), \
+        f"{me}: 'tbl' must be sorted by \"{_defs.TS}\" column"
+
+    timestamps, prices = tbl[_defs.TS], tbl[_defs.PRICE]
+
+    # round down first timestamp to given period to get start point
+    start_timestamp = int(timestamps[0] // period * period)
+
+    # index of the candle every tick belongs to. Candles are closed on the
+    # period boundary, so the tick at the very start goes to the first one
+    candle_idx = _np.maximum(
+        _np.ceil((timestamps - start_timestamp) / period).astype(_np.int64)
+        - 1, 0)
+
+    # first tick of every traded candle
+    starts = _np.flatnonzero(_np.diff(candle_idx, prepend=-1))
+    traded_idx = candle_idx[starts]
+
+    # traded candles: timestamps aligned to periods close except the last
+    # incomplete candle that uses the last tick timestamp
+    traded = _np.zeros(len(starts), dtype=[(_defs.TS, int),
+                                           (_defs.OPEN, _np.float64),
+                                           (_defs.HIGH, _np.float64),
+                                           (_defs.LOW, _np.float64),
+                                           (_defs.CLOSE, _np.float64),
+                                           (_defs.COUNT, _np.int64)])
+    traded[_defs.TS] = start_timestamp + (traded_idx + 1) * period
+    traded[_defs.TS][-1] = int(timestamps[-1])
+    traded[_defs.OPEN] = prices[starts]
+    traded[_defs.HIGH] = _np.maximum.reduceat(prices, starts)
+    traded[_defs.LOW] = _np.minimum.reduceat(prices, starts)
+    traded[_defs.CLOSE] = prices[_np.append(starts[1:], len(prices)) - 1]
+    traded[_defs.COUNT] = 1
+
+    # runs of empty candles between traded ones repeat previous close price
+    gaps = _np.flatnonzero(_np.diff(traded_idx) > 1)
+    runs = _np.zeros(len(gaps), dtype=traded.dtype)
+    runs[_defs.TS] = start_timestamp + (traded_idx[gaps] + 2) * period
+    for col in (_defs.OPEN, _defs.HIGH, _defs.LOW, _defs.CLOSE):
+        runs[col] = traded[_defs.CLOSE][gaps]
+    runs[_defs.COUNT] = traded_idx[gaps + 1] - traded_idx[gaps] - 1
+
+    # every run follows its traded candle
+    return _np.insert(traded, gaps + 1, runs)
+
+
+@assert_table_is_valid
+def calculate_sparse_ema(tbl: _np.ndarray, length: int = 14) -> _np.ndarray:
+    """
+    Calculate EMA over close prices of given sparse candlesticks table. Run of
+     k candles with constant price is evaluated in closed form
+     "close + (ema - close) * (1 - smooth)^k" instead of k steps
+
+    Args:
+        tbl (numpy.ndarray): structured array containing timestamps, close
+                             prices and number of candles in each row
+        length (int): integer constant to evaluate smooth coefficient with
+                      equation "2/(length + 1)"
+
+    Returns:
+        one-dimension numpy ndarray with EMA values at the end of each row
+    """
+
+    # set alias for function name
+    me = f"{calculate_sparse_ema.__name__}()"
+    # assert that given EMA length is positive non-zero integer
+    assert isinstance(length, int) and length > 0, \
+        f"{me}: 'length' must be positive non-zero integer, {length} given"
+    # assert that given table has 'close' and 'count' columns
+    for col in (_defs.CLOSE, _defs.COUNT):
+        assert col in tbl.dtype.names, \
+            f"{me}: 'tbl' must contain named column \"{col}\""
+
+    # initialize EMA ndarray
+    ema = _np.zeros(tbl.size, dtype=[(_defs.EMA, _np.float64)])
+
+    # Convert given 'length' to decay coefficient of each row
+    decay = (1 - 2 / (length + 1)) ** tbl[_defs.COUNT].astype(_np.float64)
+
+    # Set EMA start value to the first close price to avoid transition process
+    value = _copy(tbl[_defs.CLOSE][0])
+
+    # Fill the column with EMA values
+    for i, (close_price, row_decay) in enumerate(zip(tbl[_defs.CLOSE],
+                                                     decay)):
+        value = close_price + (value - close_price) * row_decay
+        ema[i] = value
+
+    return ema
+
+
+def sparse_to_dense(tbl: _np.ndarray, ema: _np.ndarray,
+                    period: int = Period["5m"], length: int = 14) -> tuple:
+    """
+    Expand sparse candlesticks and their EMA to the tables returned by
+     :convert_to_candlesticks: and :calculate_ema:
+
+    Args:
+        tbl (numpy.ndarray): sparse candlesticks table
+        ema (numpy.ndarray): EMA calculated over sparse candlesticks table
+        period (int): candlestick duration in seconds
+        length (int): EMA length used to calculate 'ema'
+
+    Returns:
+        tuple of dense candlesticks and EMA structured numpy.ndarrays
+    """
+
+    counts = tbl[_defs.COUNT]
+    rows = _np.repeat(_np.arange(len(tbl)), counts)
+    # position of every candle inside its row starting from 1
+    steps = _np.arange(len(rows)) - _np.repeat(_np.cumsum(counts) - counts,
+                                               counts) + 1
+
+    candles = _np.zeros(len(rows), dtype=[(_defs.TS, int),
+                                          (_defs.OPEN, _np.float64),
+                                          (_defs.HIGH, _np.float64),
+                                          (_defs.LOW, _np.float64),
+                                          (_defs.CLOSE, _np.float64)])
+    candles[_defs.TS] = tbl[_defs.TS][rows] + (steps - 1) * period
+    for col in (_defs.OPEN, _defs.HIGH, _defs.LOW, _defs.CLOSE):
+        candles[col] = tbl[col][rows]
+
+    # EMA inside a run decays from the EMA of the previous row to the close
+    # price, the last candle of a row gets the EMA of the row itself
+    prev_ema = _np.append(tbl[_defs.CLOSE][:1], ema[_defs.EMA][:-1])[rows]
+    close = tbl[_defs.CLOSE][rows]
+    dense_ema = _np.zeros(len(rows), dtype=[(_defs.EMA, _np.float64)])
+    dense_ema[_defs.EMA] = close + (prev_ema - close) * \
+        (1 - 2 / (length + 1)) ** steps.astype(_np.float64)
+    last = _np.cumsum(counts) - 1
+    dense_ema[_defs.EMA][last] = ema[_defs.EMA]
+
+    return candles, dense_ema
+
+
+def read_csv_file(filename: str) -> _np.ndarray:
+    """
+    Read given csv file into timestamp-price structured array assuming that
+     first column is datetime string and second is prices
+
+    Args:
+        filename (str): path to csv-file containing timestamp-price pairs
+
+    Returns:
+        structured numpy.ndarray with timestamp and price columns
+    """
+
+    # function converts string datetime to timestamp
+    def datetime2timestamp(s: str) -> float:
+        return _datetime.fromisoformat(s).timestamp()
+
+    return _np.genfromtxt(filename, delimiter=',', encoding="ascii",
+                          skip_header=1, names=(_defs.TS, _defs.PRICE),
+                          usecols=(0, 1),
+                          converters={0: datetime2timestamp,
+                                      1: _np.float64})
+
+
 @_defs.csv_file_is_valid
-def process_csv_file(filename: str, period: str, length: int) -> _DataFrame:
+def process_csv_file(filename: str, period: str, length: int,
+                     sparse: bool = False) -> _DataFrame:
     """
     Read given csv file into numpy structured array, convert prices to
      candlesticks with given period and then calculate EMA with given length
@@ -213,28 +415,64 @@ def process_csv_file(filename: str, period: str, length: int) -> _DataFrame:
         filename (str): path to csv-file containing timestamp-price pairs
         period (str): candlesticks duration, see :Period.marks: in defs.py
         length (int): number of observations to calculate EMA
+        sparse (bool): store runs of empty candles in run-length form and
+                       expand them only for the output DataFrame
 
     Returns:
         pandas DataFrame with timestamps, candlestick prices and calculated EMA
     """
 
-    # function converts string datetime to timestamp
-    def datetime2timestamp(s: str) -> float:
-        return _datetime.fromisoformat(s).timestamp()
+    # read prices from CSV file
+    prices = read_csv_file(filename)
+
+    return _process_prices(prices, period, length, sparse)
+
+
+@_defs.csv_files_are_valid
+def process_csv_files(filenames: list, period: str, length: int,
+                      window: int = _ingest.DISORDER_WINDOW,
+                      sparse: bool = False) -> _DataFrame:
+    """
+    Merge given csv files into a single time-ordered timestamp-price table,
+     convert prices to candlesticks with given period and then calculate EMA
+     with given length over a candlesticks close prices.
+    The function assumed to be called from outside
+
+    Args:
+        filenames (list): paths to csv-files containing timestamp-price pairs
+        period (str): candlesticks duration, see :Period.marks: in defs.py
+        length (int): number of observations to calculate EMA
+        window (int): number of positions a tick may be out of order within
+                      its file
+        sparse (bool): store runs of empty candles in run-length form and
+                       expand them only for the output DataFrame
+
+    Returns:
+        pandas DataFrame with timestamps, candlestick prices and calculated EMA
+    """
+
+    # merge files into one sorted table without duplicate ticks
+    prices = _ingest.merge_csv_files(filenames, window)
+
+    return _process_prices(prices, period, length, sparse)
+
 
-    # read prices from CSV file assuming that first column is datetime string
-    # and second is prices
-    prices = _np.genfromtxt(filename, delimiter=',', encoding="ascii",
-                            skip_header=1, names=(_defs.TS, _defs.PRICE),
-                            usecols=(0, 1),
-                            converters={0: datetime2timestamp,
-                                        1: _np.float64})
+def _process_prices(prices: _np.ndarray, period: str, length: int,
+                    sparse: bool = False) -> _DataFrame:
+    """Calculate candlesticks and EMA for given timestamp-price table"""
 
-    # convert timestamp-price ndarray to candlesticks
-    candles = convert_to_candlesticks(prices, Period[period])
+    if sparse:
+        # calculate candlesticks and EMA in run-length form and expand them
+        # for the output only
+        candles = convert_to_sparse_candlesticks(prices, Period[period])
+        ema = calculate_sparse_ema(candles, length)
+        candles, ema = sparse_to_dense(candles, ema, Period[period], length)
+    else:
+        # convert timestamp-price ndarray to candlesticks
+        candles = convert_to_candlesticks(prices, Period[period])
 
-    # create ema array from candlesticks
-    ema = calculate_ema(candles, length)
+        # create ema array from candlesticks
+        ema = calculate_ema(candles, length)
 
     # merge candlesticks with ema in pandas DataFrame,
     # use numpy.datetime64 array of timestamps as index,
@@ -70,6 +70,11 @@ def convert_to_candlesticks(df: _pd.DataFrame,
         f"{convert_to_candlesticks.__name__}(): 'df' must contain " \
         f"{_defs.PRICE} column to calculate candlesticks"
 
+    # assert given dataframe is sorted by timestamp: first price is used as
+    # initial close value
+    assert df.index.is_monotonic_increasing, \
+        f"{convert_to_candlesticks.__name__}(): 'df' index must be sorted"
+
     # use the custom aggregator to resample Timestamp-Price dataframe to OHLC
     # with given period and avoid NaN values
     pa = _PeriodAggregator(df[_defs.PRICE][0])
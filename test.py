@@ -1,12 +1,25 @@
 """Unit-test module"""
 
+import os
+import sys
+import time
+import json
+import subprocess
 from typing import Iterable, Tuple
 from random import randint
+from threading import Thread
+from socket import socket, AF_UNIX, SOCK_STREAM
 import pytest
 import numpy as np
 
 from numpy_implementation import calculate_ema as ema_numpy, \
-    convert_to_candlesticks as ohlc_numpy, Period as Period_numpy
+    convert_to_candlesticks as ohlc_numpy, Period as Period_numpy, \
+    convert_to_sparse_candlesticks as sparse_ohlc_numpy, \
+    calculate_sparse_ema as sparse_ema_numpy, sparse_to_dense
+from ingest import merge_ticks, repair_local_disorder
+from numpy_implementation import process_csv_file as process_numpy
+from daemon import QueryDaemon, _LruCache, _load_ticks
+from client import query
 import defs
 
 
@@ -134,3 +147,232 @@ def test_numpy_candlesticks(period: str):
     # assert equality of reference and test tables for listed columns
     for col in (defs.TS, defs.OPEN, defs.HIGH, defs.LOW, defs.CLOSE):
         assert np.array_equal(test_table[col], ref_table[col])
+
+
+@pytest.mark.parametrize("window", (1, 2, 16))
+def test_repair_local_disorder(window: int):
+    """
+    Move every third tick two positions forward and assert that the stream is
+    repaired only if it fits the window
+    """
+    ticks = [(float(ts), float(ts)) for ts in range(99)]
+    shuffled = [ticks[i - i % 3 + (i + 1) % 3] for i in range(len(ticks))]
+    if window < 2:
+        with pytest.raises(AssertionError):
+            list(repair_local_disorder(shuffled, window))
+    else:
+        assert list(repair_local_disorder(shuffled, window)) == ticks
+
+
+def test_repair_local_disorder_is_stable():
+    """Assert that ticks with equal timestamps keep their order"""
+    ticks = [(float(i // 4), float(-i)) for i in range(40)]
+    assert list(repair_local_disorder(ticks[::-1], len(ticks))) == \
+        sorted(ticks[::-1], key=lambda tick: tick[0])
+
+
+def test_merge_ticks():
+    """
+    Merge overlapping sources with duplicates and assert that the result is
+    the sorted union of ticks
+    """
+    first = [(float(ts), float(ts)) for ts in range(0, 60, 2)]
+    second = [(float(ts), float(ts)) for ts in range(30, 90, 3)]
+    merged = list(merge_ticks(first, second, first))
+    assert merged == sorted(set(first) | set(second))
+
+
+def test_merge_ticks_repeated_prices():
+    """
+    Assert that a price repeated within the same second of a source is kept
+    and only ticks repeated across overlapping sources are dropped
+    """
+    ticks = [(0., 10.), (0., 11.), (0., 10.), (1., 5.)]
+    assert list(merge_ticks(ticks)) == ticks
+    assert list(merge_ticks(ticks, ticks[1:])) == ticks
+    # the largest per-source count of every tick survives
+    assert list(merge_ticks(ticks[:2], ticks)) == \
+        [(0., 10.), (0., 11.), (0., 10.), (1., 5.)]
+
+
+def test_numpy_candlesticks_unsorted():
+    """Pass unsorted time series to the function under test"""
+    prices_table, _ = get_ohlc_prices_and_reference(Period_numpy["1m"])
+    with pytest.raises(AssertionError):
+        ohlc_numpy(prices_table[::-1], Period_numpy["1m"])
+
+
+@pytest.mark.parametrize("period", defs.Period.marks)
+def test_numpy_sparse_candlesticks(period: str):
+    """
+    Pass generated time series with long gaps to the sparse functions and
+    compare expanded output with dense candlesticks and EMA
+    """
+    prices_table, _ = get_ohlc_prices_and_reference(Period_numpy[period])
+    # keep every fourth period only to make runs of empty candles
+    prices_table = prices_table[(prices_table[defs.TS] - 1) //
+                                Period_numpy[period] % 4 == 0]
+
+    ref_table = ohlc_numpy(prices_table, Period_numpy[period])
+    ref_ema = ema_numpy(ref_table, 14)
+
+    sparse_table = sparse_ohlc_numpy(prices_table, Period_numpy[period])
+    assert len(sparse_table) < len(ref_table)
+    assert sparse_table[defs.COUNT].sum() == len(ref_table)
+
+    test_table, test_ema = sparse_to_dense(
+        sparse_table, sparse_ema_numpy(sparse_table, 14),
+        Period_numpy[period], 14)
+    for col in (defs.TS, defs.OPEN, defs.HIGH, defs.LOW, defs.CLOSE):
+        assert np.array_equal(test_table[col], ref_table[col])
+    assert np.allclose(test_ema[defs.EMA], ref_ema[defs.EMA])
+
+
+def test_lru_cache_concurrent_calculation():
+    """
+    Request the same key from several threads and assert that the value is
+    calculated once and its size is counted once
+    """
+    cache = _LruCache(1000)
+    calls = []
+
+    def calculate():
+        calls.append(None)
+        return (np.zeros(100, dtype=np.uint8),)
+
+    threads = [Thread(target=cache.get_or_calculate, args=("key", calculate))
+               for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 100
+
+
+def test_daemon_disk_cache(tmp_path):
+    """
+    Load two versions of the same csv file and assert that only the latest
+    one is kept in cache directory
+    """
+    csv_filename = tmp_path / "prices.csv"
+    cache_dir = tmp_path / "cache"
+    for version, mtime in ((1, 1_000_000), (2, 2_000_000)):
+        csv_filename.write_text(f"timestamp,price\n"
+                                f"2023-01-01 00:00:00,{version}\n"
+                                f"2023-01-01 00:00:01,{version}\n")
+        os.utime(csv_filename, (mtime, mtime))
+        ticks = _load_ticks(str(csv_filename), str(cache_dir),
+                            os.stat(csv_filename))
+        assert np.all(ticks[defs.PRICE] == version)
+        assert len(os.listdir(cache_dir)) == 1
+
+
+def test_daemon_query(tmp_path):
+    """
+    Query the daemon twice with the same csv file and compare responses with
+    the output of the numpy implementation
+    """
+    csv_filename = str(tmp_path / "prices.csv")
+    with open(csv_filename, "w", encoding="ascii") as csv_file:
+        csv_file.write("timestamp,price\n")
+        for minute, price in ((0, 10), (1, 12), (2, 11), (30, 15), (31, 9)):
+            csv_file.write(f"2023-01-01 00:{minute:02d}:05,{price}\n")
+    reference = process_numpy(csv_filename, "1m", 3)
+
+    socket_path = str(tmp_path / "daemon.sock")
+    with QueryDaemon(socket_path, cache_dir=str(tmp_path)) as daemon:
+        Thread(target=daemon.serve_forever, daemon=True).start()
+        request = {"csv": csv_filename, "period": "1m", "length": 3}
+
+        first = query(request, socket_path)
+        second = query(request, socket_path)
+        assert not first["cached"] and second["cached"]
+        assert first["rows"] == second["rows"]
+
+        rows = np.array(first["rows"])
+        assert np.array_equal(rows[:, 1:5], reference.iloc[:, :4].values)
+        assert np.allclose(rows[:, 5], reference[defs.EMA].values)
+
+        # time range keeps EMA of the whole series
+        ranged = query({**request, "start": rows[5, 0], "end": rows[-3, 0]},
+                       socket_path)
+        assert ranged["rows"] == first["rows"][5:-2]
+
+        assert "error" in query({**request, "period": "2m"}, socket_path)
+        # valid JSON that is not an object
+        for invalid in ([], "x", 1):
+            assert "error" in query(invalid, socket_path)
+        # deeply nested JSON raises RecursionError while decoding
+        with socket(AF_UNIX, SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall(b"[" * 100000 + b"]" * 100000 + b"\n")
+            with sock.makefile("rb") as response:
+                assert "error" in json.loads(response.readline())
+        daemon.shutdown()
+
+
+def test_daemon_keeps_existing_files(tmp_path):
+    """
+    Assert that the daemon never removes a regular file or the socket of a
+    running daemon
+    """
+    csv_filename = tmp_path / "prices.csv"
+    csv_filename.write_text("timestamp,price\n")
+    with pytest.raises(FileExistsError):
+        QueryDaemon(str(csv_filename), cache_dir=str(tmp_path))
+    assert csv_filename.is_file()
+
+    socket_path = str(tmp_path / "daemon.sock")
+    with QueryDaemon(socket_path, cache_dir=str(tmp_path)) as daemon:
+        Thread(target=daemon.serve_forever, daemon=True).start()
+        with pytest.raises(FileExistsError):
+            QueryDaemon(socket_path, cache_dir=str(tmp_path))
+        assert "error" not in query({"command": "stats"}, socket_path)
+        daemon.shutdown()
+
+    # socket of stopped daemon is stale and may be reused
+    stale = socket(AF_UNIX, SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    QueryDaemon(socket_path, cache_dir=str(tmp_path)).server_close()
+
+
+@pytest.fixture
+def central_european_time(monkeypatch):
+    """Switch local time zone of the test process and its children to CET"""
+    monkeypatch.setenv("TZ", "CET-1CEST,M3.5.0,M10.5.0/3")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_client_time_range(tmp_path, central_european_time):
+    """
+    Run the client in non-UTC time zone and assert that printed candles stay
+    inside requested time range
+    """
+    csv_filename = str(tmp_path / "prices.csv")
+    with open(csv_filename, "w", encoding="ascii") as csv_file:
+        csv_file.write("timestamp,price\n")
+        for day in (1, 2):
+            for hour in range(24):
+                csv_file.write(f"2023-01-{day:02d} {hour:02d}:30:00,{hour}\n")
+
+    socket_path = str(tmp_path / "daemon.sock")
+    with QueryDaemon(socket_path, cache_dir=str(tmp_path)) as daemon:
+        Thread(target=daemon.serve_forever, daemon=True).start()
+        output = subprocess.run(
+            [sys.executable, "client.py", "--socket", socket_path,
+             "--csv", csv_filename, "--period", "1h",
+             "--start", "2023-01-02 00:00:00",
+             "--end", "2023-01-02 02:00:00"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True).stdout
+        daemon.shutdown()
+
+    timestamps = [line.split(",")[0] for line in output.splitlines()[1:]]
+    assert timestamps == ["2023-01-02 00:00:00", "2023-01-02 01:00:00",
+                          "2023-01-02 02:00:00"]